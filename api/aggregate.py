@@ -0,0 +1,340 @@
+"""Columnar telemetry mirror backing the group-by aggregation endpoint.
+
+Rows from `telemetry_store` are copied into growable numpy columns (dictionary-encoded
+service/provider/region, epoch-ms timestamps, float metrics and a log-bucket id per metric),
+so aggregation queries are vectorized scans instead of Python loops over dicts.
+Percentiles are approximate, within `RELATIVE_ACCURACY` of the true value.
+"""
+import json
+import logging
+import math
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+METRICS = ('cpu', 'memory', 'latency_ms', 'cost_per_min')
+DIMENSIONS = ('service', 'provider', 'region')
+RELATIVE_ACCURACY = 0.01
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = np.log(_GAMMA)
+# log-bucket ids are clamped to +/-_MAX_BUCKET (about 1e-12..1e12); values beyond that
+# saturate, and their percentiles are still clipped to the group's exact min/max
+_MAX_BUCKET = 1400
+# bucket id stored for zero/negative (and missing) values
+_ZERO_BUCKET = -_MAX_BUCKET - 1
+# dense group keys are used while the key space stays below this size
+_DENSE_KEY_LIMIT = 1 << 22
+# queries producing more groups than this are rejected; each group holds a histogram per metric
+MAX_GROUPS = 5_000
+# bound on groups x histogram buckets for one metric (int64 histogram plus its cumulative sum)
+MAX_HISTOGRAM_CELLS = 4_000_000
+
+logger = logging.getLogger("api.aggregate")
+
+
+def dimension_key(value):
+    """Return a hashable stand-in for a dimension value; lists/dicts are keyed by their JSON text."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def _metric_value(value) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    try:
+        v = float(value)
+    except OverflowError:
+        return math.nan
+    # non-finite values cannot be summarised (or serialised), treat them as missing
+    return v if math.isfinite(v) else math.nan
+
+
+def parse_timestamp_ms(value) -> Optional[int]:
+    """Accept epoch milliseconds, epoch seconds or ISO-8601 strings (as emitted by the simulator)."""
+    if isinstance(value, bool):
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            # anything below ~1973 in ms is assumed to be epoch seconds
+            ms = int(value if value > 1e11 else value * 1000)
+        elif isinstance(value, str):
+            ms = int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp() * 1000)
+        else:
+            return None
+    except (ValueError, OverflowError, OSError):
+        return None
+    # keep within the int64 timestamp column
+    return ms if -2 ** 62 < ms < 2 ** 62 else None
+
+
+def _bucket_ids(values: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ids = np.ceil(np.log(values) / _LOG_GAMMA)
+    ids = np.where(values > 0, np.clip(ids, -_MAX_BUCKET, _MAX_BUCKET), _ZERO_BUCKET)
+    return np.nan_to_num(ids, nan=_ZERO_BUCKET).astype(np.int16)
+
+
+class TelemetryColumns:
+    """Incrementally mirrors a telemetry list; tolerant of the list being cleared or replaced."""
+
+    def __init__(self, capacity: int = 1024):
+        self._capacity = capacity
+        self.reset()
+
+    def reset(self):
+        cap = self._capacity
+        self.size = 0
+        self.ts = np.zeros(cap, dtype=np.int64)
+        self.codes = {d: np.zeros(cap, dtype=np.int32) for d in DIMENSIONS}
+        self.values = {m: np.zeros(cap, dtype=np.float64) for m in METRICS}
+        self.buckets = {m: np.zeros(cap, dtype=np.int16) for m in METRICS}
+        # timestamps usually arrive in order; while they do, time windows are binary searched
+        self.ts_sorted = True
+        # per-dimension dictionary encoding: value -> code, and code -> value
+        self.vocab: Dict[str, Dict] = {d: {} for d in DIMENSIONS}
+        self.labels: Dict[str, list] = {d: [] for d in DIMENSIONS}
+        self.indexed = 0
+        self._last_row = None
+
+    def _code(self, dim: str, value) -> int:
+        value = dimension_key(value)
+        vocab = self.vocab[dim]
+        code = vocab.get(value)
+        if code is None:
+            code = vocab[value] = len(self.labels[dim])
+            self.labels[dim].append(value)
+        return code
+
+    def _grow(self, needed: int):
+        cap = len(self.ts)
+        if needed <= cap:
+            return
+        while cap < needed:
+            cap *= 2
+        self.ts = np.resize(self.ts, cap)
+        for d in DIMENSIONS:
+            self.codes[d] = np.resize(self.codes[d], cap)
+        for m in METRICS:
+            self.values[m] = np.resize(self.values[m], cap)
+            self.buckets[m] = np.resize(self.buckets[m], cap)
+
+    def catch_up(self, store: list):
+        """Mirror rows appended to `store` since the last call, rebuilding if it was rewritten."""
+        n = self.indexed
+        if n > len(store) or (n and store[n - 1] is not self._last_row):
+            self.reset()
+            n = 0
+        rows = []
+        for row in store[n:]:
+            if isinstance(row, dict):
+                rows.append(row)
+            elif isinstance(row, list):
+                rows.extend(item for item in row if isinstance(item, dict))
+        if rows:
+            try:
+                self._append(rows)
+            except Exception:
+                # never let one malformed row wedge ingest: retry row by row and skip failures
+                logger.exception("telemetry batch could not be mirrored; retrying row by row")
+                for row in rows:
+                    try:
+                        self._append([row])
+                    except Exception:
+                        logger.warning("skipping telemetry row that cannot be mirrored: %r", row)
+        self.indexed = len(store)
+        self._last_row = store[-1] if store else None
+
+    def _append(self, rows: List[dict]):
+        start, end = self.size, self.size + len(rows)
+        self._grow(end)
+        now = int(time.time() * 1000)
+        ts = []
+        for row in rows:
+            t = parse_timestamp_ms(row.get('timestamp'))
+            ts.append(now if t is None else t)
+        self.ts[start:end] = ts
+        if self.ts_sorted:
+            prev = self.ts[start - 1:start] if start else self.ts[:0]
+            self.ts_sorted = bool(np.all(np.diff(np.concatenate([prev, self.ts[start:end]])) >= 0))
+        for d in DIMENSIONS:
+            self.codes[d][start:end] = [self._code(d, row.get(d)) for row in rows]
+        for m in METRICS:
+            vals = np.asarray([_metric_value(row.get(m)) for row in rows], dtype=np.float64)
+            self.values[m][start:end] = vals
+            self.buckets[m][start:end] = _bucket_ids(vals)
+        self.size = end
+
+    def column(self, metric: str) -> np.ndarray:
+        """Return a view of the mirrored values of `metric` (NaN where a row had none)."""
+        return self.values[metric][:self.size]
+
+    def match(self, dim: str, value) -> np.ndarray:
+        """Return a boolean mask of the mirrored rows whose `dim` equals `value`."""
+        code = self.vocab[dim].get(dimension_key(value))
+        if code is None:
+            return np.zeros(self.size, dtype=bool)
+        return self.codes[dim][:self.size] == code
+
+    def query(self, group_by: Sequence[str], bucket_ms: Optional[int] = None,
+              since_ms: Optional[int] = None, until_ms: Optional[int] = None,
+              filters: Optional[Dict[str, str]] = None,
+              percentiles: Sequence[float] = (50, 90, 99)) -> List[dict]:
+        """Group rows by the given dimensions (and time bucket) and summarise every metric.
+
+        Raises ValueError when the query would produce more than `MAX_GROUPS` groups or its
+        percentile histograms would exceed `MAX_HISTOGRAM_CELLS`.
+        """
+        lo, hi = 0, self.size
+        mask = None
+        if self.ts_sorted:
+            if since_ms is not None:
+                lo = int(np.searchsorted(self.ts[:hi], since_ms, side='left'))
+            if until_ms is not None:
+                hi = int(np.searchsorted(self.ts[:hi], until_ms, side='right'))
+        else:
+            ts = self.ts[:hi]
+            if since_ms is not None:
+                mask = ts >= since_ms
+            if until_ms is not None:
+                mask = ts <= until_ms if mask is None else mask & (ts <= until_ms)
+        for dim, value in (filters or {}).items():
+            code = self.vocab[dim].get(dimension_key(value))
+            if code is None:
+                return []
+            match = self.codes[dim][lo:hi] == code
+            mask = match if mask is None else mask & match
+        rows = np.flatnonzero(mask) if mask is not None else None
+        if hi <= lo or (rows is not None and not len(rows)):
+            return []
+
+        def col(arr):
+            return arr[lo:hi] if rows is None else arr[lo:hi][rows]
+
+        # combine dimension codes (and the time bucket) into one integer key per row
+        key = np.zeros(hi - lo if rows is None else len(rows), dtype=np.int64)
+        space = 1
+        cards = []
+        for dim in group_by:
+            card = max(1, len(self.labels[dim]))
+            key = key * card + col(self.codes[dim])
+            space *= card
+            cards.append(card)
+        t0 = 0
+        if bucket_ms:
+            tb = col(self.ts) // bucket_ms
+            t0 = int(tb.min())
+            tb -= t0
+            card = int(tb.max()) + 1
+            key = key * card + tb
+            space *= card
+            cards.append(card)
+
+        if space <= _DENSE_KEY_LIMIT:
+            group_keys = np.flatnonzero(np.bincount(key, minlength=space))
+            remap = np.zeros(space, dtype=np.int64)
+            remap[group_keys] = np.arange(len(group_keys))
+            gid = remap[key]
+        else:
+            group_keys, gid = np.unique(key, return_inverse=True)
+        ngroups = len(group_keys)
+        if ngroups > MAX_GROUPS:
+            raise ValueError(f"query produces {ngroups} groups (limit {MAX_GROUPS}); "
+                             "use fewer group_by dimensions, a larger bucket or a narrower time range")
+
+        # decode group keys back into dimension values / bucket start
+        decoded = []
+        rest = group_keys.copy()
+        for card in reversed(cards):
+            decoded.append((rest % card).tolist())
+            rest //= card
+        decoded.reverse()
+
+        out: List[dict] = [{} for _ in range(ngroups)]
+        for i, dim in enumerate(group_by):
+            labels = self.labels[dim]
+            for g, code in enumerate(decoded[i]):
+                out[g][dim] = labels[code]
+        if bucket_ms:
+            for g, tb in enumerate(decoded[-1]):
+                out[g]['bucket_start'] = (tb + t0) * bucket_ms
+        for g, c in enumerate(np.bincount(gid, minlength=ngroups).tolist()):
+            out[g]['count'] = c
+
+        qs = np.asarray(percentiles, dtype=np.float64)
+        for m in METRICS:
+            summaries = _summarise(gid, ngroups, col(self.values[m]), col(self.buckets[m]), qs)
+            for g, summary in enumerate(summaries):
+                out[g][m] = summary
+        # group keys are already ordered by dictionary code / bucket; present them by label
+        out.sort(key=lambda r: tuple('' if r[d] is None else str(r[d]) for d in group_by) + (r.get('bucket_start', 0),))
+        return out
+
+
+def _summarise(gid: np.ndarray, ngroups: int, values: np.ndarray, buckets: np.ndarray,
+               qs: np.ndarray) -> List[dict]:
+    valid = ~np.isnan(values)
+    if not valid.all():
+        gid, values, buckets = gid[valid], values[valid], buckets[valid]
+    counts = np.bincount(gid, minlength=ngroups)
+    sums = np.bincount(gid, weights=values, minlength=ngroups)
+    mins = np.full(ngroups, np.inf)
+    maxs = np.full(ngroups, -np.inf)
+    np.minimum.at(mins, gid, values)
+    np.maximum.at(maxs, gid, values)
+
+    pct = np.zeros((ngroups, len(qs)))
+    if len(values):
+        # per-group histogram over the log buckets present in the query window; zero/negative
+        # values go in a slot just below the smallest positive bucket so the histogram stays narrow
+        b = buckets.astype(np.int32)
+        lo, hi = int(b.min()), int(b.max())
+        if lo == _ZERO_BUCKET:
+            positive = b[b != _ZERO_BUCKET]
+            lo = int(positive.min()) if len(positive) else 0
+            hi = max(hi, lo)
+        bmin = lo - 1
+        nb = hi - bmin + 1
+        if ngroups * nb > MAX_HISTOGRAM_CELLS:
+            raise ValueError(f"query needs {ngroups} groups x {nb} histogram buckets (limit {MAX_HISTOGRAM_CELLS} "
+                             "cells); use fewer groups or a narrower time range")
+        b = np.maximum(b, bmin) - bmin
+        slots = gid * nb + b if ngroups * nb >= 2 ** 31 else gid.astype(np.int32) * nb + b
+        hist = np.bincount(slots, minlength=ngroups * nb).reshape(ngroups, nb)
+        cum = np.cumsum(hist, axis=1)
+        # offset each group's cumulative counts so all rows form one sorted array, then find the
+        # first bucket whose cumulative count exceeds each rank with a single searchsorted
+        stride = int(counts.max()) + 1
+        offsets = np.arange(ngroups, dtype=np.int64) * stride
+        ranks = qs[None, :] / 100.0 * (counts[:, None] - 1) + offsets[:, None]
+        pos = np.searchsorted((cum + offsets[:, None]).ravel(), ranks.ravel(), side='right').reshape(ranks.shape)
+        ids = np.clip(pos - (np.arange(ngroups) * nb)[:, None], 0, nb - 1) + bmin
+        approx = np.where(ids < lo, 0.0, 2 * _GAMMA ** ids.astype(np.float64) / (_GAMMA + 1))
+        # saturated edge buckets have no meaningful midpoint; report the group's exact extreme
+        approx = np.where(ids >= _MAX_BUCKET, maxs[:, None], approx)
+        approx = np.where(ids == -_MAX_BUCKET, mins[:, None], approx)
+        pct = np.clip(approx, mins[:, None], maxs[:, None])
+
+    out = []
+    for g, c in enumerate(counts.tolist()):
+        if not c:
+            out.append({"count": 0})
+            continue
+        total = float(sums[g])
+        # individually finite values can still overflow when summed; JSON has no infinity
+        total = total if math.isfinite(total) else None
+        summary = {
+            "count": c,
+            "sum": None if total is None else round(total, 6),
+            "avg": None if total is None else round(total / c, 6),
+            "min": float(mins[g]),
+            "max": float(maxs[g]),
+        }
+        for q, v in zip(qs.tolist(), pct[g].tolist()):
+            summary[f"p{q:g}"] = round(v, 6)
+        out.append(summary)
+    return out
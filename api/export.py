@@ -0,0 +1,157 @@
+"""Streaming encoders for bulk export of the in-memory stores.
+
+Exports walk a snapshot of the store (its length at request time) in fixed-size chunks, so
+memory stays flat regardless of store size and concurrent appends are not included.
+Arrow IPC and Parquet output need the optional `pyarrow` dependency.
+"""
+import csv
+import io
+import json
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from api.aggregate import parse_timestamp_ms
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+
+CHUNK_ROWS = 10_000
+
+# column name -> arrow type name used for CSV headers and Arrow/Parquet schemas
+COLUMNS: Dict[str, Sequence[tuple]] = {
+    "telemetry": (
+        ("timestamp", "timestamp"), ("service", "string"), ("provider", "string"), ("region", "string"),
+        ("cpu", "float64"), ("memory", "float64"), ("latency_ms", "float64"), ("cost_per_min", "float64"),
+    ),
+    "decisions": (
+        ("service", "string"), ("region", "string"), ("from_provider", "string"),
+        ("current_provider", "string"), ("recommended_provider", "string"), ("reason", "string"),
+        ("confidence", "float64"), ("estimated_cost_per_min", "float64"),
+        ("first_seen", "timestamp"), ("last_seen", "timestamp"), ("count", "int64"),
+    ),
+}
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def iter_snapshot(store: list, end: int, overrides: Optional[Dict[int, dict]] = None,
+                  chunk_rows: int = CHUNK_ROWS) -> Iterator[List[dict]]:
+    """Yield chunks of dict rows from `store[:end]`, flattening legacy nested lists.
+
+    `overrides` maps store positions to frozen copies of rows that may still be mutated in place.
+    """
+    overrides = overrides or {}
+    for start in range(0, end, chunk_rows):
+        # the store may have been cleared while streaming; stop rather than fail mid-response
+        stop = min(start + chunk_rows, end, len(store))
+        if stop <= start:
+            return
+        chunk = []
+        for i, row in enumerate(store[start:stop], start):
+            if isinstance(row, dict):
+                chunk.append(overrides.get(i, row))
+            elif isinstance(row, list):
+                chunk.extend(item for item in row if isinstance(item, dict))
+        if chunk:
+            yield chunk
+
+
+def encode_ndjson(chunks: Iterator[List[dict]]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield "".join(json.dumps(row, default=str) + "\n" for row in chunk).encode()
+
+
+def encode_csv(chunks: Iterator[List[dict]], dataset: str) -> Iterator[bytes]:
+    names = [name for name, _ in COLUMNS[dataset]]
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=names, extrasaction="ignore")
+    writer.writeheader()
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands back whatever pyarrow wrote since the last drain."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _arrow_schema(dataset: str):
+    types = {"string": pa.string(), "float64": pa.float64(), "int64": pa.int64(),
+             "timestamp": pa.timestamp("ms", tz="UTC")}
+    return pa.schema([(name, types[kind]) for name, kind in COLUMNS[dataset]])
+
+
+def _arrow_value(kind: str, value):
+    if value is None:
+        return None
+    if kind == "timestamp":
+        return parse_timestamp_ms(value)
+    if kind in ("float64", "int64"):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        return float(value) if kind == "float64" else int(value)
+    return str(value)
+
+
+def _arrow_batch(chunk: List[dict], dataset: str, schema):
+    arrays = []
+    for (name, kind), field in zip(COLUMNS[dataset], schema):
+        arrays.append(pa.array([_arrow_value(kind, row.get(name)) for row in chunk], type=field.type))
+    return pa.record_batch(arrays, schema=schema)
+
+
+def encode_arrow(chunks: Iterator[List[dict]], dataset: str, fmt: str) -> Iterator[bytes]:
+    """Encode chunks as an Arrow IPC stream or Parquet file (one record batch / row group per chunk)."""
+    schema = _arrow_schema(dataset)
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for chunk in chunks:
+            batch = _arrow_batch(chunk, dataset, schema)
+            if fmt == "parquet":
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -1,15 +1,21 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import os
 import asyncio
+import multiprocessing
 from pydantic import BaseModel, Field
 import random
 import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from api.aggregate import DIMENSIONS, TelemetryColumns, dimension_key
+from api import export
+from api.whatif import plan_chunks, simulate_chunk, summarize
 
 
 # Models for deploy requests and computed decisions
@@ -50,6 +56,16 @@ class PriceRequest(BaseModel):
     provider: Optional[str] = None
 
 
+class WhatIfRequest(BaseModel):
+    services: List[str] = Field(..., min_length=1, description="Services to move")
+    provider: str = Field(..., description="Candidate provider to move the services to")
+    region: Optional[str] = Field(None, description="Candidate region (optional)")
+    max_latency_ms: Optional[int] = Field(None, gt=0, description="Latency requirement used for breach probability")
+    samples: int = Field(100_000, gt=0, le=5_000_000, description="Number of Monte Carlo samples")
+    confidence: float = Field(0.9, gt=0.0, lt=1.0, description="Width of the reported intervals")
+    seed: Optional[int] = Field(None, ge=0, description="Seed for reproducible runs")
+
+
 def compute_price(provider: str, cpu: float, memory: float) -> float:
     p = PRICING.get(provider, PRICING['aws'])
     return round(cpu * p['cpu_per_unit'] + memory * p['mem_per_mb'], 6)
@@ -68,7 +84,62 @@ logging.basicConfig(level=logging.INFO)
 
 # In-memory stores (prototype)
 telemetry_store: List[dict] = []
+# Columnar mirror of telemetry_store for /telemetry/aggregate
+telemetry_columns = TelemetryColumns()
+# decision_store holds run records: consecutive identical decisions for the same
+# (service, region) are collapsed into one dict with first_seen/last_seen/count.
 decision_store: List[dict] = []
+# (service, region) -> index in decision_store of the latest run for that key
+_decision_runs: Dict[Tuple[Optional[str], Optional[str]], int] = {}
+
+# Fields maintained by the run-length compaction; ignored when comparing decisions
+RUN_FIELDS = ('timestamp', 'first_seen', 'last_seen', 'count')
+
+
+def _decision_content(decision: dict) -> dict:
+    return {k: v for k, v in decision.items() if k not in RUN_FIELDS}
+
+
+def record_decision(decision: dict) -> bool:
+    """Store a decision, extending the current run for its (service, region) when unchanged.
+
+    Returns True when a new run record was appended (i.e. the decision actually changed),
+    so callers only need to broadcast on a real change.
+    """
+    content = _decision_content(decision)
+    ts = decision.get('timestamp') or int(time.time() * 1000)
+    # decisions are free-form JSON; lists/dicts are not hashable, so key them by their JSON text
+    key = (dimension_key(content.get('service')), dimension_key(content.get('region')))
+    idx = _decision_runs.get(key)
+    # the index may be stale if decision_store was cleared or rewritten externally
+    if idx is not None and idx < len(decision_store):
+        run = decision_store[idx]
+        if isinstance(run, dict) and _decision_content(run) == content:
+            run['last_seen'] = ts
+            run['count'] = run.get('count', 1) + 1
+            return False
+    run = dict(content, first_seen=ts, last_seen=ts, count=1)
+    decision_store.append(run)
+    _decision_runs[key] = len(decision_store) - 1
+    return True
+
+
+def expand_decisions() -> List[dict]:
+    """Return the decision runs expanded back into one dict per recorded decision.
+
+    Runs only keep their first and last timestamps, so expansion loses the timing of repeats:
+    the first copy carries `first_seen` as its `timestamp` and every later copy carries
+    `last_seen`. Use the compact view for exact run boundaries.
+    """
+    out = []
+    for run in decision_store:
+        if not isinstance(run, dict):
+            continue
+        content = _decision_content(run)
+        count = run.get('count', 1)
+        out.append(dict(content, timestamp=run.get('first_seen')))
+        out.extend(dict(content, timestamp=run.get('last_seen')) for _ in range(count - 1))
+    return out
 
 # WebSocket manager
 class ConnectionManager:
@@ -97,6 +168,20 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+# Process pool for large what-if simulations (created lazily on first use)
+WHATIF_WORKERS = int(os.environ.get("WHATIF_WORKERS", os.cpu_count() or 1))
+WHATIF_PARALLEL_MIN_SAMPLES = int(os.environ.get("WHATIF_PARALLEL_MIN_SAMPLES", 250_000))
+_whatif_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_whatif_pool() -> ProcessPoolExecutor:
+    global _whatif_pool
+    if _whatif_pool is None:
+        # spawn rather than fork: by now the process runs uvicorn and executor threads, and
+        # forking a multi-threaded process can deadlock; workers only import api.whatif/numpy
+        _whatif_pool = ProcessPoolExecutor(max_workers=WHATIF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _whatif_pool
+
 
 async def _broadcast_demo_telemetry_loop():
     """Background task that periodically generates demo telemetry and decisions.
@@ -123,6 +208,7 @@ async def _broadcast_demo_telemetry_loop():
                 'cost_per_min': cost_per_min,
             }
             telemetry_store.append(entry)
+            telemetry_columns.catch_up(telemetry_store)
             # broadcast last 10 entries to WS clients
             try:
                 await manager.broadcast({"telemetry_tail": [t for t in telemetry_store if isinstance(t, dict)][-10:]})
@@ -140,11 +226,11 @@ async def _broadcast_demo_telemetry_loop():
                     'reason': 'demo auto-decision',
                     'confidence': round(random.uniform(0.5, 0.98), 2),
                 }
-                decision_store.append(decision)
-                try:
-                    await manager.broadcast({"decisions_tail": [d for d in decision_store if isinstance(d, dict)][-10:]})
-                except Exception:
-                    pass
+                if record_decision(decision):
+                    try:
+                        await manager.broadcast({"decisions_tail": decision_store[-10:]})
+                    except Exception:
+                        pass
 
         except Exception:
             # don't let the loop die
@@ -178,6 +264,38 @@ async def get_telemetry():
                         out.append(item)
         return out
 
+@app.get("/telemetry/aggregate")
+async def aggregate_telemetry(group_by: str = "provider", bucket: Optional[int] = None,
+                              since: Optional[int] = None, until: Optional[int] = None,
+                              service: Optional[str] = None, provider: Optional[str] = None,
+                              region: Optional[str] = None, percentiles: str = "50,90,99"):
+    """Group telemetry by any of service/provider/region (comma separated) and an optional time bucket.
+
+    `bucket` is in seconds and `since`/`until` are epoch milliseconds. Each group reports count, sum,
+    avg, min, max and approximate percentiles of cpu, memory, latency_ms and cost_per_min.
+    """
+    dims = [g.strip() for g in group_by.split(',') if g.strip()]
+    unknown = [g for g in dims if g not in DIMENSIONS]
+    if unknown or len(set(dims)) != len(dims):
+        return JSONResponse({"error": f"group_by must be distinct values from {list(DIMENSIONS)}"}, status_code=400)
+    if bucket is not None and bucket <= 0:
+        return JSONResponse({"error": "bucket must be a positive number of seconds"}, status_code=400)
+    try:
+        qs = [float(q) for q in percentiles.split(',') if q.strip()]
+    except ValueError:
+        qs = []
+    if not qs or any(not 0 <= q <= 100 for q in qs):
+        return JSONResponse({"error": "percentiles must be comma separated values between 0 and 100"}, status_code=400)
+
+    filters = {k: v for k, v in (("service", service), ("provider", provider), ("region", region)) if v is not None}
+    telemetry_columns.catch_up(telemetry_store)
+    try:
+        groups = telemetry_columns.query(dims, bucket_ms=bucket * 1000 if bucket else None,
+                                         since_ms=since, until_ms=until, filters=filters, percentiles=qs)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return {"group_by": dims, "bucket": bucket, "groups": groups}
+
 @app.post("/telemetry")
 async def post_telemetry(req: Request):
     payload = await req.json()
@@ -191,6 +309,7 @@ async def post_telemetry(req: Request):
     else:
         # ignore other payload shapes
         pass
+    telemetry_columns.catch_up(telemetry_store)
 
     # broadcast latest telemetry to ws clients (ensure list of dicts)
     tail = [t for t in telemetry_store if isinstance(t, dict)]
@@ -198,35 +317,72 @@ async def post_telemetry(req: Request):
     return JSONResponse({"status": "ok"})
 
 @app.get("/decisions")
-async def get_decisions():
-    # flatten any nested lists for robustness
-        # Return a flattened list of decisions (filter out malformed entries)
-        out = []
-        for d in decision_store:
-            if isinstance(d, dict):
-                out.append(d)
-            elif isinstance(d, list):
-                for item in d:
-                    if isinstance(item, dict):
-                        out.append(item)
-        return out
+async def get_decisions(view: str = "expanded"):
+    """Return decisions either expanded (one dict per decision) or compacted into runs.
+
+    The compact view returns the stored run records with `first_seen`, `last_seen` and `count`.
+    """
+    if view == "compact":
+        return [d for d in decision_store if isinstance(d, dict)]
+    if view != "expanded":
+        return JSONResponse({"error": f"unknown view '{view}' (expected 'expanded' or 'compact')"}, status_code=400)
+    return expand_decisions()
 
 @app.post("/decisions")
 async def post_decision(req: Request):
     payload = await req.json()
     # Accept list or single decision
-    if isinstance(payload, list):
-        for item in payload:
-            if isinstance(item, dict):
-                decision_store.append(item)
-    elif isinstance(payload, dict):
-        decision_store.append(payload)
+    items = payload if isinstance(payload, list) else [payload]
+    changed = False
+    for item in items:
+        if isinstance(item, dict):
+            changed = record_decision(item) or changed
+
+    # repeats only extend an existing run, so broadcast on a real change only
+    if changed:
+        await manager.broadcast({"decisions_tail": decision_store[-10:]})
+    return JSONResponse({"status": "ok"})
+
+
+@app.get("/export/{dataset}")
+async def export_store(dataset: str, format: str = "ndjson"):
+    """Stream the telemetry or decision store as NDJSON, CSV, Arrow IPC or Parquet.
+
+    The export covers a snapshot of the store taken when the request starts and is encoded in
+    chunks, so memory stays flat and concurrent ingest keeps running between chunks. Decisions
+    are exported as run records (see `record_decision`).
+    """
+    if dataset not in export.COLUMNS:
+        return JSONResponse({"error": f"unknown dataset '{dataset}' (expected 'telemetry' or 'decisions')"}, status_code=404)
+    if format not in export.FORMATS:
+        return JSONResponse({"error": f"unknown format '{format}' (expected one of {list(export.FORMATS)})"}, status_code=400)
+    if format in ("arrow", "parquet") and export.pa is None:
+        return JSONResponse({"error": f"format '{format}' requires pyarrow to be installed"}, status_code=400)
+
+    store = telemetry_store if dataset == "telemetry" else decision_store
+    end = len(store)
+    overrides = None
+    if dataset == "decisions":
+        # the latest run per key is still extended in place; freeze it at snapshot time
+        overrides = {i: dict(decision_store[i]) for i in _decision_runs.values()
+                     if i < end and isinstance(decision_store[i], dict)}
+    chunks = export.iter_snapshot(store, end, overrides)
+    if format == "ndjson":
+        body = export.encode_ndjson(chunks)
+    elif format == "csv":
+        body = export.encode_csv(chunks, dataset)
     else:
-        pass
+        body = export.encode_arrow(chunks, dataset, format)
 
-    tail = [d for d in decision_store if isinstance(d, dict)]
-    await manager.broadcast({"decisions_tail": tail[-10:]})
-    return JSONResponse({"status": "ok"})
+    async def stream():
+        for part in body:
+            yield part
+            # give ingest handlers a turn between chunks
+            await asyncio.sleep(0)
+
+    media_type, ext = export.FORMATS[format]
+    headers = {"Content-Disposition": f'attachment; filename="{dataset}.{ext}"'}
+    return StreamingResponse(stream(), media_type=media_type, headers=headers)
 
 
 @app.post("/deploy_request")
@@ -237,7 +393,7 @@ async def handle_deploy_request(req: Request):
     - Look at recent `telemetry_store` entries to estimate provider cost for the requested service/region.
     - If telemetry exists for providers, pick the provider with the lowest recent `cost_per_min`.
     - Otherwise, fall back to default static prices.
-    - Append the resulting decision to `decision_store` and broadcast it to WebSocket clients.
+    - Record the resulting decision in `decision_store` and broadcast it to WebSocket clients if it changed.
     """
     payload = await req.json()
     try:
@@ -283,9 +439,9 @@ async def handle_deploy_request(req: Request):
         estimated_cost_per_min=round(float(est_cost), 6)
     )
 
-    # store and broadcast
-    decision_store.append(decision.dict())
-    await manager.broadcast({"decisions_tail": decision_store[-10:]})
+    # store and broadcast (only when it starts a new run)
+    if record_decision(decision.dict()):
+        await manager.broadcast({"decisions_tail": decision_store[-10:]})
 
     return JSONResponse(decision.dict())
 
@@ -311,6 +467,90 @@ async def price(req: Request):
 
     return JSONResponse(results)
 
+def _empirical_samples(services: List[str], provider: str, region: Optional[str]) -> dict:
+    """Collect observed (cost_per_min, latency_ms) pairs per service on the candidate provider/region.
+
+    Reads masked columns from `telemetry_columns`. Falls back to all services on that
+    provider/region, then to the provider alone, when a service has no telemetry there yet.
+    Returns {service: (costs, latencies, basis)}; services without usable telemetry are omitted.
+    """
+    telemetry_columns.catch_up(telemetry_store)
+    cost = telemetry_columns.column('cost_per_min')
+    latency = telemetry_columns.column('latency_ms')
+    same_provider = telemetry_columns.match('provider', provider) & ~np.isnan(cost) & ~np.isnan(latency)
+    same_placement = same_provider & telemetry_columns.match('region', region) if region else same_provider
+
+    out = {}
+    for svc in services:
+        exact = same_placement & telemetry_columns.match('service', svc)
+        for basis, mask in (("service", exact), ("provider_region", same_placement), ("provider", same_provider)):
+            if mask.any():
+                out[svc] = (cost[mask], latency[mask], basis)
+                break
+    return out
+
+
+@app.post("/whatif")
+async def whatif(req: Request):
+    """Project the monthly cost and latency risk of moving services to a candidate provider/region.
+
+    Runs a bootstrap Monte Carlo over the empirical telemetry distributions. Runs of at least
+    `WHATIF_PARALLEL_MIN_SAMPLES` samples are split across a process pool.
+    """
+    payload = await req.json()
+    try:
+        wr = WhatIfRequest(**payload)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    started = time.perf_counter()
+    services = list(dict.fromkeys(wr.services))
+    empirical = _empirical_samples(services, wr.provider, wr.region)
+    if len(empirical) != len(services):
+        return JSONResponse({"error": f"no telemetry for provider '{wr.provider}'"}, status_code=400)
+    costs, latencies, basis = [], [], {}
+    for svc in services:
+        found = empirical[svc]
+        costs.append(found[0])
+        latencies.append(found[1])
+        basis[svc] = {"basis": found[2], "telemetry_samples": len(found[0])}
+
+    chunk_sizes = [wr.samples]
+    if wr.samples >= WHATIF_PARALLEL_MIN_SAMPLES and WHATIF_WORKERS > 1:
+        chunk_sizes = plan_chunks(wr.samples, WHATIF_WORKERS)
+    seeds = np.random.SeedSequence(wr.seed).spawn(len(chunk_sizes))
+
+    if len(chunk_sizes) == 1:
+        chunks = [await asyncio.to_thread(simulate_chunk, costs, latencies, wr.samples, wr.max_latency_ms, seeds[0])]
+    else:
+        loop = asyncio.get_running_loop()
+        pool = _get_whatif_pool()
+        chunks = await asyncio.gather(*[
+            loop.run_in_executor(pool, simulate_chunk, costs, latencies, n, wr.max_latency_ms, seed)
+            for n, seed in zip(chunk_sizes, seeds)
+        ])
+
+    result = summarize(list(chunks), services, wr.confidence)
+    for svc in services:
+        result["per_service"][svc].update(basis[svc])
+    result.update({
+        "services": services,
+        "provider": wr.provider,
+        "region": wr.region,
+        "max_latency_ms": wr.max_latency_ms,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    })
+    return JSONResponse(result)
+
+
+@app.on_event("shutdown")
+async def _stop_whatif_pool():
+    global _whatif_pool
+    if _whatif_pool is not None:
+        _whatif_pool.shutdown(wait=False, cancel_futures=True)
+        _whatif_pool = None
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
@@ -329,9 +569,10 @@ async def status():
     Useful for lightweight health/debug checks from the frontend or CI.
     """
     tcount = sum(1 for t in telemetry_store if isinstance(t, dict))
-    dcount = sum(1 for d in decision_store if isinstance(d, dict))
+    runs = [d for d in decision_store if isinstance(d, dict)]
+    dcount = sum(d.get('count', 1) for d in runs)
     ws_count = len(manager.active_connections)
-    return {"telemetry_count": tcount, "decisions_count": dcount, "ws_active": ws_count}
+    return {"telemetry_count": tcount, "decisions_count": dcount, "decision_runs": len(runs), "ws_active": ws_count}
 
 # Serve static frontend if present
 FRONTEND_DIST = os.path.join(os.path.dirname(__file__), '..', 'frontend', 'dist')
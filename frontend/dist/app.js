@@ -80,8 +80,10 @@
     list.forEach(d=>{
       const el = document.createElement('div');
       el.className = 'decision';
-      const time = new Date(d.timestamp || Date.now()).toLocaleTimeString();
-      el.innerHTML = `<div style="display:flex;justify-content:space-between;align-items:center"><strong>${d.service||'service'}</strong><span style="font-size:12px;color:var(--muted)">${time}</span></div>
+      // run records (compact view / ws) carry last_seen and count instead of a single timestamp
+      const time = new Date(d.last_seen || d.timestamp || Date.now()).toLocaleTimeString();
+      const repeats = (d.count && d.count > 1) ? ` ×${d.count}` : '';
+      el.innerHTML = `<div style="display:flex;justify-content:space-between;align-items:center"><strong>${d.service||'service'}${repeats}</strong><span style="font-size:12px;color:var(--muted)">${time}</span></div>
         <div style="margin-top:6px">from <strong>${d.current_provider}</strong> → <strong>${d.recommended_provider}</strong></div>
         <div style="margin-top:6px;color:var(--muted);font-size:13px">${d.reason || ''} · confidence ${d.confidence ?? '-'} </div>`;
       decisionsList.appendChild(el);
@@ -249,7 +251,7 @@
       try{
         const telemetryResp = await fetch((API_BASE || '') + '/telemetry');
         if(telemetryResp.ok){ const t = await telemetryResp.json(); if(t && t.length){ applyTelemetryUpdate(t); stopDemoTelemetry(); setStatus('connected (poll)'); try{ if(dbgPoll) dbgPoll.textContent = 'ok'; }catch(e){} return; } }
-        const decisionsResp = await fetch((API_BASE || '') + '/decisions');
+        const decisionsResp = await fetch((API_BASE || '') + '/decisions?view=compact');
         if(decisionsResp.ok){ const d = await decisionsResp.json(); if(d && d.length){ applyDecisionUpdate(d); stopDemoTelemetry(); setStatus('connected (poll)'); try{ if(dbgPoll) dbgPoll.textContent = 'ok'; }catch(e){} return; } }
         // if no telemetry returned, leave demo mode running (demoCheckLoop handles start/stop)
       }catch(e){ console.debug('poll failed', e); try{ if(dbgPoll) dbgPoll.textContent = 'fail'; }catch(err){} }
@@ -158,6 +158,17 @@ def run_tests():
     subprocess.check_call([str(py), '-m', 'pytest', '-q'], cwd=str(ROOT))
 
 
+def run_bench(update_baseline: bool = False):
+    py = venv_python()
+    if not py.exists():
+        raise RuntimeError('venv python not found; run --setup first')
+    env = dict(os.environ, RUN_BENCHMARKS='1')
+    if update_baseline:
+        env['BENCH_UPDATE_BASELINE'] = '1'
+    print('Running benchmark suite (tests/test_benchmarks.py)...')
+    subprocess.check_call([str(py), '-m', 'pytest', '-q', '-s', 'tests/test_benchmarks.py'], cwd=str(ROOT), env=env)
+
+
 def run_lint():
     py = venv_python()
     if not py.exists():
@@ -195,6 +206,8 @@ def parse_args():
     p.add_argument('--install-dev', action='store_true', help='Install development requirements into venv (pytest, ruff, mypy)')
     p.add_argument('--run-tests', action='store_true', help='Run pytest using the venv')
     p.add_argument('--lint', action='store_true', help='Run ruff and mypy if available')
+    p.add_argument('--bench', action='store_true', help='Run the API benchmark/regression suite using the venv')
+    p.add_argument('--update-baseline', action='store_true', help='With --bench, store results as the new baseline')
     return p.parse_args()
 
 
@@ -229,6 +242,9 @@ def main():
         if args.lint:
             ensure_venv()
             run_lint()
+        if args.bench:
+            ensure_venv()
+            run_bench(update_baseline=args.update_baseline)
     except subprocess.CalledProcessError as e:
         print('Command failed:', e)
         sys.exit(1)
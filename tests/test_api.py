@@ -1,4 +1,10 @@
+import csv
+import io
+import json
+
+import pytest
 from fastapi.testclient import TestClient
+from api import aggregate
 from api import main as api_main
 
 
@@ -54,3 +60,215 @@ def test_telemetry_and_decisions_post_get():
     assert r.status_code == 200
     decisions = r.json()
     assert any(item.get("service") == "testsvc" for item in decisions)
+
+
+def test_repeated_decisions_are_compacted_into_runs():
+    d = {
+        "service": "testsvc",
+        "current_provider": "aws",
+        "recommended_provider": "aws",
+        "region": "us-east-1",
+        "reason": "rule: keep",
+    }
+    # unevenly spaced repeats: expansion must not invent intermediate times
+    times = [1_700_000_000_000 + dt for dt in (0, 100, 1000, 1100, 9000)]
+    for ts in times:
+        assert client.post("/decisions", json=dict(d, timestamp=ts)).status_code == 200
+    changed = dict(d, recommended_provider="alibaba")
+    assert client.post("/decisions", json=changed).status_code == 200
+
+    r = client.get("/decisions", params={"view": "compact"})
+    assert r.status_code == 200
+    runs = r.json()
+    assert [run["count"] for run in runs] == [5, 1]
+    assert (runs[0]["first_seen"], runs[0]["last_seen"]) == (times[0], times[-1])
+
+    r = client.get("/decisions")
+    assert r.status_code == 200
+    decisions = r.json()
+    assert len(decisions) == 6
+    assert sum(1 for item in decisions if item["recommended_provider"] == "aws") == 5
+    assert [item["timestamp"] for item in decisions[:5]] == [times[0]] + [times[-1]] * 4
+    assert all("timestamp" in item for item in decisions)
+
+    r = client.get("/status")
+    assert r.json()["decisions_count"] == 6
+    assert r.json()["decision_runs"] == 2
+
+
+def test_decisions_with_unhashable_service_are_stored():
+    d = {"service": ["a", "b"], "region": {"zone": "x"}, "recommended_provider": "aws"}
+    assert client.post("/decisions", json=d).status_code == 200
+    assert client.post("/decisions", json=d).status_code == 200
+    r = client.get("/decisions", params={"view": "compact"})
+    assert [(run["service"], run["count"]) for run in r.json()] == [(["a", "b"], 2)]
+
+
+def test_whatif_projects_cost_and_latency_breach():
+    for cost, latency in [(0.001, 100), (0.002, 300), (0.003, 500)]:
+        client.post("/telemetry", json={
+            "service": "testsvc", "provider": "alibaba", "region": "eu-west-1",
+            "cpu": 0.5, "memory": 128, "latency_ms": latency, "cost_per_min": cost,
+        })
+
+    r = client.post("/whatif", json={
+        "services": ["testsvc", "othersvc"], "provider": "alibaba", "region": "eu-west-1",
+        "max_latency_ms": 400, "samples": 20000, "seed": 7,
+    })
+    assert r.status_code == 200
+    body = r.json()
+    low, high = body["cost_per_min"]["interval"]
+    assert low <= body["cost_per_min"]["p50"] <= high
+    ci_low, ci_high = body["monthly_cost"]["mean_ci"]
+    assert ci_low <= body["monthly_cost"]["mean"] <= ci_high
+    # two services each averaging $0.002/min over a 30-day month
+    assert abs(body["monthly_cost"]["mean"] - 2 * 0.002 * 43200) < 5
+    assert 0.4 < body["latency_breach_probability"] < 0.7
+    assert body["per_service"]["othersvc"]["basis"] == "provider_region"
+
+    r = client.post("/whatif", json={"services": ["testsvc"], "provider": "gcp"})
+    assert r.status_code == 400
+    r = client.post("/whatif", json={"services": ["testsvc"], "provider": "alibaba", "seed": -1})
+    assert r.status_code == 400
+
+
+def test_whatif_large_runs_use_process_pool(monkeypatch):
+    monkeypatch.setattr(api_main, "WHATIF_WORKERS", 2)
+    monkeypatch.setattr(api_main, "WHATIF_PARALLEL_MIN_SAMPLES", 10)
+    for cost, latency in [(0.001, 100), (0.003, 500)]:
+        client.post("/telemetry", json={"service": "testsvc", "provider": "aws", "region": "us-east-1",
+                                        "latency_ms": latency, "cost_per_min": cost})
+    try:
+        r = client.post("/whatif", json={"services": ["testsvc"], "provider": "aws",
+                                         "max_latency_ms": 300, "samples": 100_000, "seed": 1})
+        assert r.status_code == 200
+        assert api_main._whatif_pool is not None
+        body = r.json()
+        assert body["samples"] == 100_000
+        assert abs(body["monthly_cost"]["mean"] - 0.002 * 43200) < 2
+        assert 0.45 < body["latency_breach_probability"] < 0.55
+    finally:
+        if api_main._whatif_pool is not None:
+            api_main._whatif_pool.shutdown()
+            api_main._whatif_pool = None
+
+
+def test_telemetry_aggregate_group_by_provider_and_bucket(monkeypatch):
+    base = 1_700_000_000_000 - (1_700_000_000_000 % 300_000)
+    rows = [
+        {"service": "a", "provider": "aws", "region": "us-east-1", "cpu": 1.0, "memory": 128,
+         "latency_ms": 100, "cost_per_min": 0.002, "timestamp": base},
+        {"service": "b", "provider": "aws", "region": "eu-west-1", "cpu": 3.0, "memory": 256,
+         "latency_ms": 300, "cost_per_min": 0.004, "timestamp": base + 1_000},
+        {"service": "a", "provider": "alibaba", "region": "us-east-1", "cpu": 2.0, "memory": 64,
+         "latency_ms": 200, "cost_per_min": 0.001, "timestamp": base + 400_000},
+    ]
+    assert client.post("/telemetry", json=rows).status_code == 200
+
+    r = client.get("/telemetry/aggregate", params={"group_by": "provider"})
+    assert r.status_code == 200
+    groups = {g["provider"]: g for g in r.json()["groups"]}
+    assert groups["aws"]["count"] == 2
+    assert groups["aws"]["cpu"]["avg"] == 2.0
+    assert groups["aws"]["latency_ms"]["min"] == 100
+    assert groups["aws"]["latency_ms"]["max"] == 300
+    assert abs(groups["aws"]["latency_ms"]["p50"] - 100) <= 2
+    assert groups["alibaba"]["cost_per_min"]["sum"] == 0.001
+
+    r = client.get("/telemetry/aggregate", params={"group_by": "service", "bucket": 300, "provider": "aws"})
+    assert r.status_code == 200
+    groups = r.json()["groups"]
+    assert [(g["service"], g["bucket_start"], g["count"]) for g in groups] == [("a", base, 1), ("b", base, 1)]
+
+    assert client.get("/telemetry/aggregate", params={"group_by": "color"}).status_code == 400
+    monkeypatch.setattr(aggregate, "MAX_GROUPS", 2)
+    r = client.get("/telemetry/aggregate", params={"group_by": "service,provider"})
+    assert r.status_code == 400
+    assert "limit 2" in r.json()["error"]
+    assert client.get("/telemetry/aggregate", params={"bucket": 0}).status_code == 400
+
+
+def test_malformed_telemetry_rows_do_not_wedge_aggregation():
+    bad = [
+        {"service": ["x"], "provider": {"name": "aws"}, "region": "us-east-1", "cost_per_min": 0.002},
+        {"service": "y", "provider": "aws", "region": "us-east-1", "cost_per_min": 10 ** 400,
+         "timestamp": float("inf")},
+    ]
+    assert client.post("/telemetry", content=json.dumps(bad), headers={"content-type": "application/json"}).status_code == 200
+    assert client.post("/telemetry", json={"service": "a", "provider": "aws", "region": "us-east-1",
+                                           "latency_ms": 100, "cost_per_min": 0.001}).status_code == 200
+    assert api_main.telemetry_columns.indexed == len(api_main.telemetry_store)
+
+    r = client.get("/telemetry/aggregate", params={"group_by": "service"})
+    assert r.status_code == 200
+    groups = {g["service"]: g for g in r.json()["groups"]}
+    assert groups['["x"]']["count"] == 1
+    # an overflowing cost is treated as missing rather than poisoning the sums
+    assert groups["y"]["cost_per_min"]["count"] == 0
+    r = client.get("/telemetry/aggregate", params={"group_by": "provider", "service": "a"})
+    assert [g["count"] for g in r.json()["groups"]] == [1]
+    r = client.post("/whatif", json={"services": ["a"], "provider": "aws", "samples": 1000, "seed": 1})
+    assert r.status_code == 200
+
+
+def test_aggregate_histograms_stay_bounded_for_extreme_values(monkeypatch):
+    rows = [{"service": f"s{i}", "provider": "aws", "region": "us-east-1",
+             "latency_ms": 1e-200 if i % 2 else 1e200, "cost_per_min": 0.002}
+            for i in range(2000)]
+    assert client.post("/telemetry", json=rows).status_code == 200
+    # ids saturate at +/-1e12, so the histogram spans ~2800 buckets rather than ~92k
+    assert aggregate._bucket_ids(aggregate.np.array([1e-200, 1e200])).tolist() == [-1400, 1400]
+
+    monkeypatch.setattr(aggregate, "MAX_HISTOGRAM_CELLS", 1_000_000)
+    r = client.get("/telemetry/aggregate", params={"group_by": "service"})
+    assert r.status_code == 400
+    assert "histogram buckets" in r.json()["error"]
+
+    r = client.get("/telemetry/aggregate", params={"group_by": "provider"})
+    assert r.status_code == 200
+    lat = r.json()["groups"][0]["latency_ms"]
+    assert lat["min"] == 1e-200 and lat["max"] == 1e200
+    # percentiles are rounded to 6 decimals, so the low half reads as 0
+    assert lat["p50"] == 0.0
+    assert lat["p99"] == 1e200
+
+
+def test_export_streams_snapshot_as_ndjson_and_csv():
+    rows = [
+        {"service": f"svc{i}", "provider": "aws", "region": "us-east-1", "cpu": 0.5,
+         "memory": 64, "latency_ms": 10 + i, "cost_per_min": 0.001, "timestamp": 1_700_000_000_000 + i}
+        for i in range(25)
+    ]
+    assert client.post("/telemetry", json=rows).status_code == 200
+
+    r = client.get("/export/telemetry", params={"format": "ndjson"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert [row["service"] for row in lines] == [f"svc{i}" for i in range(25)]
+
+    r = client.get("/export/telemetry", params={"format": "csv"})
+    assert r.status_code == 200
+    parsed = list(csv.DictReader(io.StringIO(r.text)))
+    assert len(parsed) == 25
+    assert parsed[3]["latency_ms"] == "13"
+
+    d = {"service": "svc0", "recommended_provider": "aws", "region": "us-east-1", "reason": "rule: keep"}
+    for _ in range(3):
+        client.post("/decisions", json=d)
+    r = client.get("/export/decisions")
+    assert [json.loads(line)["count"] for line in r.text.splitlines()] == [3]
+
+    assert client.get("/export/other").status_code == 404
+    assert client.get("/export/telemetry", params={"format": "xml"}).status_code == 400
+
+
+def test_export_arrow_stream_when_pyarrow_available():
+    pa = pytest.importorskip("pyarrow")
+    client.post("/telemetry", json={"service": "svc", "provider": "aws", "region": "us-east-1",
+                                    "cpu": 1, "latency_ms": 5, "timestamp": "2026-01-01T00:00:00+00:00"})
+    r = client.get("/export/telemetry", params={"format": "arrow"})
+    assert r.status_code == 200
+    table = pa.ipc.open_stream(r.content).read_all()
+    assert table.num_rows == 1
+    assert table.column("cpu").to_pylist() == [1.0]
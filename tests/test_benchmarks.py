@@ -0,0 +1,197 @@
+"""In-process performance-regression suite for the API hot paths.
+
+Skipped unless RUN_BENCHMARKS=1, e.g.:
+
+  RUN_BENCHMARKS=1 python -m pytest -q -s tests/test_benchmarks.py
+
+Requests go through the ASGI app in process (httpx.ASGITransport), so no server or network
+is needed. Each case records ops/sec, latency percentiles and the peak traced allocation of
+one extra request, and fails if it regresses beyond `tests/benchmarks_baseline.json` by more
+than BENCH_TOLERANCE (default 0.5, i.e. 50%). The baseline holds absolute numbers from one
+machine; regenerate it (BENCH_UPDATE_BASELINE=1) on the machine that runs the suite.
+
+Other knobs:
+  BENCH_SIZES=1000,100000       store sizes to run (default 1000,100000,1000000)
+  BENCH_BUDGET=1.0              seconds of timed requests per case
+  BENCH_UPDATE_BASELINE=1       write this run's results as the new baseline
+  BENCH_RESULTS=path.json       also write this run's results to a file
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import tracemalloc
+from pathlib import Path
+
+import httpx
+import pytest
+
+from api import main as api_main
+
+
+pytestmark = pytest.mark.skipif(os.environ.get("RUN_BENCHMARKS") != "1",
+                                reason="set RUN_BENCHMARKS=1 to run the benchmark suite")
+
+BASELINE_PATH = Path(__file__).with_name("benchmarks_baseline.json")
+SIZES = [int(s) for s in os.environ.get("BENCH_SIZES", "1000,100000,1000000").split(",") if s.strip()]
+SUBSCRIBERS = [0, 100]
+BROADCAST_SUBSCRIBERS = [1, 100, 1000]
+BUDGET_S = float(os.environ.get("BENCH_BUDGET", "1.0"))
+TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", "0.5"))
+MIN_ITERS = 1
+MAX_ITERS = 5000
+# allocation noise floor so tiny peaks do not flap
+MEMORY_SLACK_KB = 256
+
+SERVICES = ['fetcher', 'indexer', 'ranker', 'ingestor', 'api']
+PROVIDERS = ['aws', 'alibaba', 'gcp', 'azure']
+REGIONS = ['us-east-1', 'eu-west-1', 'ap-south-1', 'cn-hangzhou']
+
+results: dict = {}
+
+
+class _Subscriber:
+    """Stands in for a connected WebSocket; serializes like starlette's send_json."""
+
+    async def send_json(self, message):
+        json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+def _make_rows(n: int) -> list:
+    rng = random.Random(42)
+    start = 1_700_000_000_000
+    return [{
+        "timestamp": start + i * 3000,
+        "service": rng.choice(SERVICES),
+        "provider": rng.choice(PROVIDERS),
+        "region": rng.choice(REGIONS),
+        "cpu": round(rng.uniform(0.1, 2.0), 2),
+        "memory": round(rng.uniform(32, 1024), 2),
+        "latency_ms": rng.randint(10, 350),
+        "cost_per_min": round(rng.uniform(0.001, 0.005), 6),
+    } for i in range(n)]
+
+
+@pytest.fixture(scope="module")
+def seed_rows():
+    rows = _make_rows(max(SIZES))
+    yield rows
+    api_main.telemetry_store.clear()
+    api_main.decision_store.clear()
+    api_main.manager.active_connections = []
+    _finish()
+
+
+def _prepare(rows: list, size: int, subscribers: int):
+    api_main.telemetry_store[:] = rows[:size]
+    api_main.decision_store.clear()
+    api_main.manager.active_connections = [_Subscriber() for _ in range(subscribers)]
+
+
+async def _measure(op) -> dict:
+    await op()  # warm-up (also lets the aggregation columns catch up with the seeded store)
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < MIN_ITERS or (time.perf_counter() - started < BUDGET_S and len(latencies) < MAX_ITERS):
+        t = time.perf_counter()
+        await op()
+        latencies.append(time.perf_counter() - t)
+    elapsed = sum(latencies)
+
+    tracemalloc.start()
+    try:
+        await op()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+
+    def pct(q):
+        return round(latencies[min(len(latencies) - 1, int(q / 100 * len(latencies)))] * 1000, 3)
+
+    return {
+        "iterations": len(latencies),
+        "ops_per_sec": round(len(latencies) / elapsed, 2),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "peak_mem_kb": round(peak / 1024, 1),
+    }
+
+
+async def _measure_http(method: str, path: str, payload=None) -> dict:
+    transport = httpx.ASGITransport(app=api_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def op():
+            r = await client.request(method, path, json=payload)
+            assert r.status_code == 200, r.text
+
+        return await _measure(op)
+
+
+def _check(name: str, result: dict):
+    results[name] = result
+    print(f"\n{name}: {result}")
+    if os.environ.get("BENCH_UPDATE_BASELINE") == "1" or not BASELINE_PATH.exists():
+        return
+    base = json.loads(BASELINE_PATH.read_text()).get(name)
+    if base is None:
+        return
+    failures = []
+    if result["ops_per_sec"] < base["ops_per_sec"] / (1 + TOLERANCE):
+        failures.append(f"ops/sec {result['ops_per_sec']} vs baseline {base['ops_per_sec']}")
+    if result["p95_ms"] > base["p95_ms"] * (1 + TOLERANCE):
+        failures.append(f"p95 {result['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+    if result["peak_mem_kb"] > base["peak_mem_kb"] * (1 + TOLERANCE) + MEMORY_SLACK_KB:
+        failures.append(f"peak memory {result['peak_mem_kb']}KB vs baseline {base['peak_mem_kb']}KB")
+    assert not failures, f"{name} regressed beyond {TOLERANCE:.0%}: " + "; ".join(failures)
+
+
+def _finish():
+    if not results:
+        return
+    if os.environ.get("BENCH_RESULTS"):
+        Path(os.environ["BENCH_RESULTS"]).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+    if os.environ.get("BENCH_UPDATE_BASELINE") == "1":
+        baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+        baseline.update(results)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+
+
+DEPLOY = {"service": "ranker", "cpu": 1.0, "memory": 256, "region": "eu-west-1"}
+TELEMETRY = {"service": "ranker", "provider": "aws", "region": "eu-west-1", "cpu": 0.5,
+             "memory": 128, "latency_ms": 120, "cost_per_min": 0.002, "timestamp": 1_800_000_000_000}
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_bench_handle_deploy_request(seed_rows, size):
+    _prepare(seed_rows, size, 0)
+    _check(f"deploy_request/n={size}", asyncio.run(_measure_http("POST", "/deploy_request", DEPLOY)))
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_bench_get_telemetry(seed_rows, size):
+    _prepare(seed_rows, size, 0)
+    _check(f"get_telemetry/n={size}", asyncio.run(_measure_http("GET", "/telemetry")))
+
+
+@pytest.mark.parametrize("subscribers", SUBSCRIBERS)
+@pytest.mark.parametrize("size", SIZES)
+def test_bench_post_telemetry(seed_rows, size, subscribers):
+    _prepare(seed_rows, size, subscribers)
+    name = f"post_telemetry/n={size}/ws={subscribers}"
+    _check(name, asyncio.run(_measure_http("POST", "/telemetry", TELEMETRY)))
+
+
+@pytest.mark.parametrize("subscribers", BROADCAST_SUBSCRIBERS)
+def test_bench_broadcast(seed_rows, subscribers):
+    _prepare(seed_rows, min(SIZES), subscribers)
+    message = {"telemetry_tail": api_main.telemetry_store[-10:]}
+
+    async def op():
+        await api_main.manager.broadcast(message)
+        assert len(api_main.manager.active_connections) == subscribers
+
+    _check(f"broadcast/ws={subscribers}", asyncio.run(_measure(op)))